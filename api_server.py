@@ -1,22 +1,32 @@
 import asyncio
 import gc
+import os
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 import httpx
+import orjson
+import psutil
 from playwright.async_api import async_playwright
-import html2text
-import trafilatura
 
-app = FastAPI(title="Web Scraper API", version="1.0.0")
+from extraction import extract_content, extract_title
+
+app = FastAPI(title="Web Scraper API", version="1.0.0", default_response_class=ORJSONResponse)
 
 
 class ScrapeRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     urls: List[str]
     callback_url: Optional[str] = None
 
 
 class ScrapeResult(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     url: str
     title: Optional[str]
     content: Optional[str]
@@ -26,57 +36,56 @@ class ScrapeResult(BaseModel):
 
 
 class ScrapeResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     results: List[ScrapeResult]
     total_urls: int
     successful: int
     failed: int
 
 
-def extract_content(html_content):
-    """Extract main content using trafilatura, fallback to html2text"""
-    
-    # Try trafilatura first - it handles most sites well
-    extracted = trafilatura.extract(
-        html_content,
-        include_links=True,
-        include_formatting=True,
-        include_tables=True,
-        no_fallback=False,
-    )
-    
-    # If trafilatura extracted meaningful content, use it
-    if extracted and len(extracted.strip()) > 200:
-        return extracted
-    
-    # Fallback to html2text for pages trafilatura can't parse
-    h = html2text.HTML2Text()
-    h.ignore_links = False
-    h.ignore_images = True
-    h.ignore_emphasis = False
-    h.body_width = 0  # Don't wrap lines
-    
-    fallback_content = h.handle(html_content)
-    
-    # Basic cleanup for fallback
-    lines = fallback_content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        stripped = line.strip()
-        # Skip common junk patterns
-        if stripped and not any([
-            stripped.startswith('Skip to'),
-            stripped.startswith('Cookie'),
-            stripped.startswith('Accept all'),
-            'privacy policy' in stripped.lower(),
-            'terms of service' in stripped.lower(),
-            len(stripped) < 3,
-        ]):
-            cleaned_lines.append(line)
-    
-    return '\n'.join(cleaned_lines)
+async def fetch_fast(url):
+    """Try a plain GET + extraction before paying for a browser render
+
+    A large share of target URLs serve their content in the initial HTML
+    with no JS needed; for those an HTTP GET is 10-30x cheaper than a
+    Chromium render. Returns None when the page needs the browser.
+    """
+    try:
+        response = await app.state.http.get(
+            url,
+            follow_redirects=True,
+            timeout=15.0,
+            headers={"User-Agent": USER_AGENT}
+        )
+    except Exception:
+        return None
+
+    if response.status_code != 200:
+        return None
+
+    html_content = response.text
+    try:
+        content = await asyncio.get_running_loop().run_in_executor(
+            extract_pool, extract_content, html_content
+        )
+    except Exception:
+        # Malformed HTML that crashes the parsers; let the browser
+        # path take a shot at it instead of failing the request
+        return None
+    if not content or len(content.strip()) <= 200:
+        return None
+
+    return {
+        "url": url,
+        "title": extract_title(html_content),
+        "content": content,
+        "status": "success",
+        "attempts": 1
+    }
 
 
-async def scrape_single_url(context, url, semaphore, max_retries=3):
+async def scrape_single_url(browser, url, semaphore, max_retries=3):
     """Scrape a single URL with concurrency control and retry logic"""
     global request_count
     
@@ -85,22 +94,50 @@ async def scrape_single_url(context, url, semaphore, max_retries=3):
         return None
     
     request_count += 1  # Track requests for periodic cleanup
-    
+
+    # Static fast path - fall through to Playwright only when it fails
+    result = await fetch_fast(url)
+    if result is not None:
+        print(f"  ⚡ Static fast path: {url}")
+        return result
+
     # Retry logic
     last_error = None
     for attempt in range(max_retries):
         async with semaphore:
+            # Fresh context per attempt: closing it forces a full JS heap
+            # reclaim, keeping RSS bounded over long runs
+            context = await browser.new_context(**CTX_OPTS)
+            await context.route("**/*", _block_resources)
             page = await context.new_page()
             try:
                 print(f"Scraping: {url} (attempt {attempt + 1}/{max_retries})")
                 await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                
+
+                # DOM-ready is enough for most pages; just wait until a
+                # content container shows up
+                try:
+                    await page.wait_for_selector("main, article, [role=main], body", timeout=5000)
+                except Exception:
+                    pass
+
                 # Get fully rendered HTML (after JS execution) with timeout
                 html_content = await asyncio.wait_for(page.content(), timeout=30000)
+
+                # Tiny initial DOM usually means an unhydrated JS shell -
+                # only those pages pay the network-idle wait
+                if len(html_content) < 500:
+                    try:
+                        await page.wait_for_load_state("networkidle", timeout=10000)
+                    except Exception:
+                        pass
+                    html_content = await asyncio.wait_for(page.content(), timeout=30000)
                 title = await asyncio.wait_for(page.title(), timeout=5000)
                 
-                # Extract main content using trafilatura
-                content = extract_content(html_content)
+                # Extract main content off the event loop (CPU-bound)
+                content = await asyncio.get_running_loop().run_in_executor(
+                    extract_pool, extract_content, html_content
+                )
                 
                 # Validate we got actual content (not just junk)
                 if not content or len(content.strip()) < 50:
@@ -132,9 +169,9 @@ async def scrape_single_url(context, url, semaphore, max_retries=3):
                 await asyncio.sleep(1)
             finally:
                 try:
-                    await page.close()
+                    await context.close()
                 except Exception as e:
-                    print(f"Warning: Failed to close page - {e}")
+                    print(f"Warning: Failed to close context - {e}")
     
     # All retries failed
     print(f"  ❌ FAILED after {max_retries} attempts: {url}")
@@ -148,108 +185,136 @@ async def scrape_single_url(context, url, semaphore, max_retries=3):
     }
 
 
-# Global browser context (keep warm)
-browser_context = None
-browser = None  # Keep track of browser instance
-semaphore = asyncio.Semaphore(5)  # Max concurrent requests
-request_count = 0  # Track total requests for periodic cleanup
-BROWSER_RESTART_INTERVAL = 50  # Restart browser every 50 requests
+# Global browser (keep warm). Contexts are created per scrape: Chromium
+# only releases a page's JS heap when its context closes, so a single
+# long-lived context grows without bound.
+playwright = None
+browser = None
 
+# With images blocked and DOM-ready waits, pages are I/O-bound - the old
+# hard cap of 5 left the box idle. The RSS guard below backs off when
+# memory gets tight.
+MAX_CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", "20"))
+RSS_LIMIT_BYTES = int(os.environ.get("SCRAPE_RSS_LIMIT_MB", "2048")) * 1024 * 1024
+semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+request_count = 0  # Total scrapes served
 
-async def restart_browser():
-    """Restart browser to clear memory leaks"""
-    global browser_context, browser
-    
-    print("🔄 Restarting browser to clear memory...")
-    
-    # Close old context and browser
-    if browser_context:
-        try:
-            await browser_context.close()
-            print("✓ Old browser context closed")
-        except Exception as e:
-            print(f"Warning: Failed to close browser context - {e}")
-    
-    if browser:
-        try:
-            await browser.close()
-            print("✓ Old browser closed")
-        except Exception as e:
-            print(f"Warning: Failed to close browser - {e}")
-    
-    # Force garbage collection to free memory
-    gc.collect()
-    print("✓ Garbage collection completed")
-    
-    # Start new browser
-    p = await async_playwright().start()
-    browser = await p.chromium.launch(
-        headless=True,
-        channel="chrome",
-        args=[
-            '--disable-dev-shm-usage',
-            '--disable-setuid-sandbox',
-            '--no-sandbox'
-        ]
-    )
-    browser_context = await browser.new_context(
-        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    )
-    print("✓ New browser context ready")
 
+async def _rss_guard():
+    """Halve effective concurrency while RSS is above the limit"""
+    proc = psutil.Process()
+    held = 0
+    while True:
+        rss = proc.memory_info().rss
+        if held == 0 and rss > RSS_LIMIT_BYTES:
+            print(f"⚠️ RSS {rss // 1024 // 1024}MB over limit, reducing concurrency")
+            gc.collect()
+            for _ in range(MAX_CONCURRENCY // 2):
+                await semaphore.acquire()
+            held = MAX_CONCURRENCY // 2
+        elif held and rss < RSS_LIMIT_BYTES * 0.8:
+            print("✓ RSS back under limit, restoring concurrency")
+            for _ in range(held):
+                semaphore.release()
+            held = 0
+        await asyncio.sleep(2)
 
-async def get_browser_context():
-    """Get or create browser context with periodic restarts"""
-    global browser_context, request_count
-    
-    # Check if browser needs restart
-    if request_count >= BROWSER_RESTART_INTERVAL:
-        print(f"🔄 Request count {request_count}, triggering browser restart...")
-        await restart_browser()
-        request_count = 0
-        return browser_context
-    
-    if browser_context is None:
-        print("Initializing browser context (cold start)...")
-        p = await async_playwright().start()
-        browser = await p.chromium.launch(
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Context options are identical for every context; freeze them once.
+# service_workers="block" stops background fetch work on many sites.
+CTX_OPTS = MappingProxyType({
+    "user_agent": USER_AGENT,
+    "viewport": {"width": 1280, "height": 800},
+    "service_workers": "block",
+})
+
+BROWSER_ARGS = [
+    '--disable-dev-shm-usage',
+    '--disable-setuid-sandbox',
+    '--no-sandbox',
+    '--blink-settings=imagesEnabled=false',
+    '--enable-features=AsyncDns',
+    '--disk-cache-size=104857600',
+    '--disable-background-networking',
+    '--disable-sync',
+    '--no-first-run'
+]
+
+# Text extraction only needs the HTML - don't spend bandwidth or decode
+# CPU on images, fonts, media or styling
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+
+
+async def _block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Extraction is pure-Python CPU work (trafilatura/lxml); running it inline
+# would block the event loop and serialize "concurrent" scrapes on one core
+extract_pool = None
+
+
+def _preload_parsers():
+    """Pre-import the parsers in each pool worker"""
+    import extraction  # noqa: F401
+
+
+async def get_browser():
+    """Get or launch the shared browser"""
+    global playwright, browser
+
+    if browser is None:
+        print("Launching browser (cold start)...")
+        playwright = await async_playwright().start()
+        browser = await playwright.chromium.launch(
             headless=True,
             channel="chrome",
-            args=[
-                '--disable-dev-shm-usage',
-                '--disable-setuid-sandbox',
-                '--no-sandbox'
-            ]
+            args=BROWSER_ARGS
         )
-        browser_context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        print("Browser context ready (warm)")
-    
-    return browser_context
+        print("Browser ready (warm)")
+
+    return browser
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize browser on startup to keep warm"""
-    await get_browser_context()
+    global extract_pool
+    extract_pool = ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        initializer=_preload_parsers,
+    )
+    # One pooled HTTP client for all callbacks - reuses TLS sessions
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=10),
+        timeout=120.0,
+    )
+    await get_browser()
+    app.state.rss_guard = asyncio.create_task(_rss_guard())
     print("🚀 Scraper API is ready (browser warm)")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
-    global browser_context, browser
+    global playwright, browser
     print("🛑 Shutting down scraper...")
-    
-    # Close browser context
-    if browser_context:
-        try:
-            await browser_context.close()
-            print("✓ Browser context closed")
-        except Exception as e:
-            print(f"Warning: Failed to close browser context - {e}")
-    
+
+    # Stop the concurrency guard
+    app.state.rss_guard.cancel()
+
+    # Close pooled HTTP client
+    await app.state.http.aclose()
+
+    # Stop extraction workers
+    if extract_pool:
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+        print("✓ Extraction pool shut down")
+
     # Close browser
     if browser:
         try:
@@ -257,6 +322,14 @@ async def shutdown_event():
             print("✓ Browser closed")
         except Exception as e:
             print(f"Warning: Failed to close browser - {e}")
+
+    # Stop Playwright
+    if playwright:
+        try:
+            await playwright.stop()
+            print("✓ Playwright stopped")
+        except Exception as e:
+            print(f"Warning: Failed to stop Playwright - {e}")
     
     # Force final garbage collection
     gc.collect()
@@ -286,33 +359,36 @@ async def scrape_urls(request: ScrapeRequest):
         raise HTTPException(status_code=400, detail="At least one URL is required")
     
     print(f"\n🚀 Starting batch of {len(request.urls)} URLs...")
-    print(f"   Concurrency limit: {semaphore._value} (max 5 parallel)")
+    print(f"   Concurrency limit: {semaphore._value} (max {MAX_CONCURRENCY} parallel)")
     
-    context = await get_browser_context()
-    tasks = [scrape_single_url(context, url, semaphore) for url in request.urls]
+    browser = await get_browser()
+    tasks = [scrape_single_url(browser, url, semaphore) for url in request.urls]
     results = await asyncio.gather(*tasks)
     
     # Filter out None results
     results = [r for r in results if r is not None]
-    
-    successful = len([r for r in results if r["status"] == "success"])
-    failed = len(results) - successful
-    
-    # Calculate total content
-    total_content = sum(len(r.get("content", "") or "") for r in results)
-    
+
+    # Build all aggregates in one pass over the results
+    successful = failed = total_content = 0
+    failed_items = []
+    for r in results:
+        if r["status"] == "success":
+            successful += 1
+        else:
+            failed += 1
+            failed_items.append((r["url"], r["error"]))
+        total_content += len(r.get("content") or "")
+
     print(f"\n📊 Batch Summary:")
     print(f"   Total URLs: {len(request.urls)}")
     print(f"   ✓ Success: {successful}")
     print(f"   ❌ Failed: {failed}")
     print(f"   Content size: {total_content:,} characters")
-    
+
     # Log failed URLs for retry tracking
-    failed_urls = [r["url"] for r in results if r["status"] == "error"]
-    if failed_urls:
+    if failed_items:
         print(f"\n⚠️ Failed URLs (will be retried):")
-        for url in failed_urls:
-            error_info = next(r["error"] for r in results if r["url"] == url)
+        for url, error_info in failed_items:
             print(f"   - {url}")
             print(f"     Error: {error_info}")
     
@@ -335,39 +411,46 @@ async def scrape_urls(request: ScrapeRequest):
 
 
 async def send_callback(callback_url: str, results: list):
-    """Send results to callback URL asynchronously using httpx"""
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        try:
-            print(f"POST to callback: {callback_url}")
-            response = await client.post(
-                callback_url,
-                json={"results": results},
-                headers={"Content-Type": "application/json"}
-            )
-            print(f"✅ Callback sent successfully: {response.status_code}")
-            print(f"   Response: {response.text[:200]}")
-            return response
-        except httpx.TimeoutException as e:
-            print(f"❌ Callback timeout: {e}")
-            raise
-        except httpx.HTTPStatusError as e:
-            print(f"❌ Callback HTTP error: {e.response.status_code}")
-            print(f"   Response: {e.response.text[:500]}")
-            raise
-        except Exception as e:
-            print(f"❌ Callback failed: {e}")
-            raise
+    """Stream results to callback URL as NDJSON using httpx"""
+
+    async def ndjson_gen():
+        # One orjson-encoded record per line: peak memory stays at the
+        # largest single result instead of the whole batch serialized at once
+        for r in results:
+            yield orjson.dumps(r) + b"\n"
+
+    try:
+        print(f"POST to callback: {callback_url}")
+        async with app.state.http.stream(
+            "POST",
+            callback_url,
+            content=ndjson_gen(),
+            headers={"Content-Type": "application/x-ndjson"}
+        ) as response:
+            await response.aread()
+        print(f"✅ Callback sent successfully: {response.status_code}")
+        print(f"   Response: {response.text[:200]}")
+        return response
+    except httpx.TimeoutException as e:
+        print(f"❌ Callback timeout: {e}")
+        raise
+    except httpx.HTTPStatusError as e:
+        print(f"❌ Callback HTTP error: {e.response.status_code}")
+        print(f"   Response: {e.response.text[:500]}")
+        raise
+    except Exception as e:
+        print(f"❌ Callback failed: {e}")
+        raise
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    global browser_context, request_count
+    global browser, request_count
     return {
         "status": "healthy",
-        "browser_warm": browser_context is not None,
-        "request_count": request_count,
-        "restarts_pending": request_count >= BROWSER_RESTART_INTERVAL
+        "browser_warm": browser is not None,
+        "request_count": request_count
     }
 
 
@@ -386,4 +469,6 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop drives the CDP websocket and callback sockets with far fewer
+    # syscalls than the stdlib selector loop; httptools replaces h11 parsing
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -0,0 +1,104 @@
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
+
+from embed import get_model, process_document, DEFAULT_BATCH_SIZE, MODEL_NAME
+
+app = FastAPI(title="Embedding API", version="1.0.0")
+
+
+class EmbedRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    text: str
+    metadata: Optional[dict] = None
+    chunk_size: int = 500
+    chunk_overlap: int = 50
+    batch_size: int = DEFAULT_BATCH_SIZE
+    parallel: int = 0
+
+
+class EmbedChunk(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    chunk_index: int
+    text: str
+    embedding: List[float]
+    metadata: dict
+
+
+class EmbedResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    chunks: List[EmbedChunk]
+    total_chunks: int
+    model: str
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Load and warm the embedding model on startup"""
+    model = get_model()
+    # The first embed call pays ONNX session init, graph optimization and
+    # memory-pattern allocation; run it on a dummy batch here so the first
+    # real request sees steady-state latency
+    list(model.embed(["warmup"]))
+    print("🚀 Embedding API is ready (model warm)")
+
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed_text(request: EmbedRequest):
+    """
+    Chunk and embed a document
+
+    - **text**: Document text to chunk and embed
+    - **metadata**: Optional metadata attached to every chunk
+    - **chunk_size** / **chunk_overlap**: Splitter settings
+    - **batch_size** / **parallel**: fastembed batching settings
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text must not be empty")
+
+    chunks = process_document(
+        request.text,
+        metadata=request.metadata,
+        chunk_size=request.chunk_size,
+        chunk_overlap=request.chunk_overlap,
+        batch_size=request.batch_size,
+        parallel=request.parallel,
+    )
+
+    print(f"Embedded {len(chunks)} chunks")
+
+    return EmbedResponse(
+        chunks=chunks,
+        total_chunks=len(chunks),
+        model=MODEL_NAME,
+    )
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "model": MODEL_NAME,
+    }
+
+
+@app.get("/")
+async def root():
+    """Root endpoint"""
+    return {
+        "service": "Embedding API",
+        "version": "1.0.0",
+        "endpoints": {
+            "POST /embed": "Chunk and embed text",
+            "GET /health": "Health check"
+        }
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8001)
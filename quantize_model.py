@@ -0,0 +1,24 @@
+import argparse
+import os
+
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize an ONNX embedding model to int8")
+    parser.add_argument("--input", required=True, help="Path to the FP32 model.onnx")
+    parser.add_argument("--output", required=True, help="Path for the quantized model_int8.onnx")
+    args = parser.parse_args()
+
+    print(f"Quantizing {args.input} -> {args.output}")
+    quantize_dynamic(args.input, args.output, weight_type=QuantType.QInt8)
+
+    original_size = os.path.getsize(args.input)
+    quantized_size = os.path.getsize(args.output)
+    print(f"Done: {original_size:,} bytes -> {quantized_size:,} bytes "
+          f"({100 - int(quantized_size / original_size * 100)}% smaller)")
+    print("Point embed.py at the quantized artifact via EMBED_MODEL / EMBED_CACHE_DIR")
+
+
+if __name__ == "__main__":
+    main()